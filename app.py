@@ -1,7 +1,9 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-from datetime import datetime
+import pyarrow as pa
+import pyarrow.compute as pc
+from datetime import date, datetime
 import io
 import base64
 import plotly.express as px
@@ -25,73 +27,156 @@ st.markdown(
     """, unsafe_allow_html=True
 )
 
-# --- Validation Logic from Original Code ---
-def is_valid_kk_no(x):
-    return isinstance(x, str) and x.isdigit() and len(x) == 16 and not x.endswith('0000')
+# --- Data Loading ---
+REQ_COLS = ['KK_NO', 'NIK', 'CUSTNAME', 'JENIS_KELAMIN', 'TANGGAL_LAHIR', 'TEMPAT_LAHIR']
 
-def is_valid_nik(x):
-    return isinstance(x, str) and x.isdigit() and len(x) == 16 and not x.endswith('0000')
+@st.cache_data
+def load_city(file_bytes: bytes) -> frozenset[str]:
+    city_df = pd.read_csv(io.BytesIO(file_bytes))
+    if 'CITY_DESC' in city_df.columns:
+        kota_list = city_df['CITY_DESC'].str.upper().str.strip().dropna().tolist()
+    else:
+        kota_list = city_df.iloc[:,0].astype(str).str.upper().str.strip().tolist()
+    return frozenset(kota_list)
 
-def is_valid_custname(x):
-    return isinstance(x, str) and not any(ch.isdigit() for ch in x)
+def load_excel(file_bytes: bytes) -> pd.DataFrame:
+    # Read all sheets from Excel through one workbook handle.
+    # A sheet with none of REQ_COLS contributes no rows.
+    xls = pd.ExcelFile(io.BytesIO(file_bytes), engine='calamine')
+    return pd.concat(
+        [pd.read_excel(xls, sheet_name=sh, dtype=str, usecols=lambda c: c in REQ_COLS) for sh in xls.sheet_names],
+        ignore_index=True
+    )
 
-def is_valid_jenis_kelamin(x):
-    return str(x).upper().strip() in {'LAKI-LAKI','LAKI - LAKI','LAKI LAKI','PEREMPUAN'}
+# --- Validation Logic ---
+GENDERS = frozenset({'LAKI-LAKI', 'LAKI - LAKI', 'LAKI LAKI', 'PEREMPUAN'})
 
-def is_valid_tempat_lahir(x, kota_list):
-    return isinstance(x, str) and x.upper().strip() in kota_list
+def is_valid_id16(s: pd.Series) -> pd.Series:
+    # KK_NO / NIK: 16 digit, tidak berakhiran '0000'
+    # Rows that are exactly 16 bytes are packed into an (n, 16) uint8 view of
+    # the Arrow data buffer and checked with whole-array byte compares.
+    arr = pa.array(s)
+    if isinstance(arr, pa.ChunkedArray):
+        arr = arr.combine_chunks()
+    cand = pc.fill_null(pc.equal(pc.binary_length(arr), 16), False)
+    ids = pc.filter(arr, cand)
+    valid = np.zeros(len(arr), dtype=bool)
+    if len(ids):
+        offsets, data = ids.buffers()[1:]
+        offset_type = np.int64 if pa.types.is_large_string(ids.type) else np.int32
+        start = np.frombuffer(offsets, dtype=offset_type)[ids.offset]
+        buf = np.frombuffer(data, dtype=np.uint8, count=16 * len(ids), offset=start).reshape(-1, 16)
+        # ASCII 0-9 only; Unicode digits are rejected
+        digits = ((buf >= ord('0')) & (buf <= ord('9'))).all(axis=1)
+        valid[cand.to_numpy(zero_copy_only=False)] = digits & (buf[:, 12:] != ord('0')).any(axis=1)
+    return pd.Series(valid, index=s.index)
 
-def is_valid_tanggal_lahir(x):
-    if pd.isna(x): return False
-    if isinstance(x, pd.Timestamp):
-        dt = x
-    else:
-        try:
-            dt = datetime.strptime(str(x), '%d/%m/%Y')
-        except Exception:
-            return False
-    return dt.date() <= datetime.today().date()
+def normalize_category(s: pd.Series) -> pd.Series:
+    # Upper/strip each distinct category once, then remap the row codes
+    codes, uniques = pd.factorize(s.cat.categories.astype(str).str.upper().str.strip())
+    codes = np.append(codes, -1)  # code -1 (missing) stays missing
+    return pd.Series(
+        pd.Categorical.from_codes(codes[s.cat.codes.to_numpy()], uniques), index=s.index
+    )
 
 # --- Data Cleaning Function ---
-def clean_data(raw_df: pd.DataFrame, kota_list: list[str]):
-    df = raw_df.copy()
-    df['Check_Desc'] = ''
-
-    # Apply validations
-    valid_kk = df['KK_NO'].apply(is_valid_kk_no)
-    valid_nik = df['NIK'].apply(is_valid_nik)
-    valid_name = df['CUSTNAME'].apply(is_valid_custname)
-    valid_gender = df['JENIS_KELAMIN'].apply(is_valid_jenis_kelamin)
-    valid_place = df['TEMPAT_LAHIR'].apply(lambda x: is_valid_tempat_lahir(x, kota_list))
-    valid_date = df['TANGGAL_LAHIR'].apply(is_valid_tanggal_lahir)
-
-    # Build clean_df
-    clean_mask = valid_kk & valid_nik & valid_name & valid_gender & valid_place & valid_date
-    clean_df = df[clean_mask].drop(columns=['Check_Desc'])
-
-    # Annotate issues
-    df.loc[~valid_kk, 'Check_Desc'] += df.loc[~valid_kk, 'KK_NO'].astype(str).apply(lambda v: f"Invalid KK_NO ({v}); ")
-    df.loc[~valid_nik, 'Check_Desc'] += df.loc[~valid_nik, 'NIK'].astype(str).apply(lambda v: f"Invalid NIK ({v}); ")
-    df.loc[~valid_name, 'Check_Desc'] += df.loc[~valid_name, 'CUSTNAME'].astype(str).apply(lambda v: f"Invalid Name ({v}); ")
-    df.loc[~valid_gender, 'Check_Desc'] += df.loc[~valid_gender, 'JENIS_KELAMIN'].astype(str).apply(lambda v: f"Invalid Gender ({v}); ")
-    df.loc[~valid_place, 'Check_Desc'] += df.loc[~valid_place, 'TEMPAT_LAHIR'].astype(str).apply(lambda v: f"Invalid Place ({v}); ")
-    df.loc[~valid_date, 'Check_Desc'] += df.loc[~valid_date, 'TANGGAL_LAHIR'].astype(str).apply(lambda v: f"Invalid Birth Date ({v}); ")
-
-    messy_df = df[df['Check_Desc'] != '']
-    return messy_df, clean_df
+ISSUE_COLS = {
+    'KK_NO': 'KK_NO',
+    'NIK': 'NIK',
+    'Name': 'CUSTNAME',
+    'Gender': 'JENIS_KELAMIN',
+    'Place': 'TEMPAT_LAHIR',
+    'Birth Date': 'TANGGAL_LAHIR',
+}
+
+def clean_data(raw_df: pd.DataFrame, kota_set: frozenset[str], today: date) -> pd.Series:
+    # Per-row uint8 bitfield: bit i is set when ISSUE_COLS category i fails
+    names = raw_df['CUSTNAME']
+    birth_dates = raw_df['TANGGAL_LAHIR_DT']
+    valid = {
+        'KK_NO': is_valid_id16(raw_df['KK_NO']),
+        'NIK': is_valid_id16(raw_df['NIK']),
+        'Name': (names.notna() & ~names.str.contains(r'\d', regex=True, na=False)).astype(bool),
+        'Gender': raw_df['JENIS_KELAMIN_N'].isin(GENDERS),
+        'Place': raw_df['TEMPAT_LAHIR_N'].isin(kota_set),
+        'Birth Date': birth_dates.notna() & (birth_dates <= pd.Timestamp(today)),
+    }
+    fail = np.zeros(len(raw_df), dtype=np.uint8)
+    for bit, label in enumerate(ISSUE_COLS):
+        fail |= (~valid[label].to_numpy()).astype(np.uint8) << bit
+    return pd.Series(fail, index=raw_df.index)
+
+def count_issues(fail: pd.Series) -> dict[str, int]:
+    fail = fail.to_numpy()
+    return {label: int(np.count_nonzero((fail >> bit) & 1)) for bit, label in enumerate(ISSUE_COLS)}
+
+def describe_issues(df: pd.DataFrame, fail: pd.Series) -> np.ndarray:
+    # Check_Desc text for the rows of df, built only when it is displayed
+    fail = fail.loc[df.index].to_numpy()
+    parts = []
+    for bit, (label, col) in enumerate(ISSUE_COLS.items()):
+        values = pc.fill_null(pa.array(df[col].astype('string'), type=pa.string()), '')
+        text = pc.binary_join_element_wise(f"Invalid {label} (", values, "); ", '')
+        parts.append(pc.if_else(((fail >> bit) & 1).astype(bool), text, ''))
+    return pc.binary_join_element_wise(*parts, '').to_numpy(zero_copy_only=False)
+
+# --- Cached Upload Pipeline ---
+def prepare_data(df_req: pd.DataFrame) -> pd.DataFrame:
+    # Arrow-backed strings for the high-cardinality text columns
+    for c in ('KK_NO', 'NIK', 'CUSTNAME'):
+        df_req[c] = df_req[c].astype('string[pyarrow]')
+    # Low-cardinality columns are normalized once per category; the
+    # originals are kept for display and the _N columns feed validation
+    for c in ('JENIS_KELAMIN', 'TEMPAT_LAHIR'):
+        df_req[c] = df_req[c].astype('category')
+        df_req[f'{c}_N'] = normalize_category(df_req[c])
+    # Parse dates once; the raw string stays in TANGGAL_LAHIR for display
+    df_req['TANGGAL_LAHIR_DT'] = pd.to_datetime(
+        df_req['TANGGAL_LAHIR'], format='%d/%m/%Y', errors='coerce'
+    )
+    return df_req
+
+# Keyed on the upload bytes, which Streamlit hashes far faster than a frame
+@st.cache_data
+def load_data(excel_bytes: bytes) -> pd.DataFrame:
+    df_req = load_excel(excel_bytes)
+    if all(c in df_req.columns for c in REQ_COLS):
+        df_req = prepare_data(df_req)
+    return df_req
+
+@st.cache_data
+def validate_upload(excel_bytes: bytes, city_bytes: bytes, today: date) -> pd.Series:
+    return clean_data(load_data(excel_bytes), load_city(city_bytes), today)
 
 # --- Excel Report Generation ---
-def generate_excel(messy: pd.DataFrame, clean: pd.DataFrame, total: int):
+def generate_excel(messy: pd.DataFrame, clean: pd.DataFrame, total: int, fail: pd.Series):
     buffer = io.BytesIO()
-    with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
+    with pd.ExcelWriter(
+        buffer, engine='xlsxwriter', engine_kwargs={'options': {'strings_to_urls': False}}
+    ) as writer:
         pd.DataFrame({
             'Metric': ['Total', 'Clean', 'Messy'],
             'Count': [total, len(clean), len(messy)]
         }).to_excel(writer, sheet_name='Summary', index=False)
         clean.to_excel(writer, sheet_name='Clean', index=False)
+        # Check_Desc goes next to the messy rows instead of into a copy of them
         messy.to_excel(writer, sheet_name='Messy', index=False)
+        pd.Series(describe_issues(messy, fail), name='Check_Desc').to_excel(
+            writer, sheet_name='Messy', index=False, startcol=messy.shape[1]
+        )
     return buffer.getvalue()
 
+# Keyed like validate_upload: the report depends only on the uploads and the date
+@st.cache_data
+def build_report(excel_bytes: bytes, city_bytes: bytes, today: date) -> bytes:
+    df_req = load_data(excel_bytes)
+    fail = validate_upload(excel_bytes, city_bytes, today)
+    messy_mask = fail != 0
+    return generate_excel(
+        df_req.loc[messy_mask, REQ_COLS], df_req.loc[~messy_mask, REQ_COLS],
+        len(df_req), fail[messy_mask]
+    )
+
 # --- Sidebar UI ---
 st.sidebar.header("📋 Upload Files")
 uploaded_excel = st.sidebar.file_uploader("Excel (.xlsx)", type=['xlsx'])
@@ -101,50 +186,33 @@ uploaded_city = st.sidebar.file_uploader("City List (.csv/.txt)", type=['csv','t
 st.markdown("<div class='title'>KK & NIK Data Validation Dashboard</div>", unsafe_allow_html=True)
 
 if uploaded_excel and uploaded_city:
-    # Load city list
-    city_df = pd.read_csv(uploaded_city)
-    if 'CITY_DESC' in city_df.columns:
-        kota_list = city_df['CITY_DESC'].str.upper().str.strip().tolist()
-    else:
-        kota_list = city_df.iloc[:,0].astype(str).str.upper().str.strip().tolist()
+    excel_bytes = uploaded_excel.getvalue()
+    city_bytes = uploaded_city.getvalue()
+    # today is part of the cache keys so future-date checks roll over daily
+    today = datetime.today().date()
 
     # Read all sheets from Excel
     try:
-        xls = pd.ExcelFile(uploaded_excel)
-        df_full = pd.concat(
-            [pd.read_excel(xls, sheet_name=sh, dtype=str) for sh in xls.sheet_names],
-            ignore_index=True
-        )
+        df_req = load_data(excel_bytes)
     except Exception as e:
         st.error(f"Error reading Excel: {e}")
         st.stop()
 
     # Required columns
-    req = ['KK_NO','NIK','CUSTNAME','JENIS_KELAMIN','TANGGAL_LAHIR','TEMPAT_LAHIR']
-    missing = [c for c in req if c not in df_full.columns]
+    missing = [c for c in REQ_COLS if c not in df_req.columns]
     if missing:
         st.error(f"Missing columns: {', '.join(missing)}")
         st.stop()
 
-    df_req = df_full[req].copy()
-    # Normalize date to consistent string
-    df_req['TANGGAL_LAHIR'] = pd.to_datetime(
-        df_req['TANGGAL_LAHIR'], format='%d/%m/%Y', errors='coerce'
-    ).dt.strftime('%d/%m/%Y')
-
     # Run cleaning
-    messy_df, clean_df = clean_data(df_req, kota_list)
+    fail = validate_upload(excel_bytes, city_bytes, today)
+    messy_mask = fail != 0
+    clean_df = df_req.loc[~messy_mask, REQ_COLS]
+    messy_df = df_req.loc[messy_mask, REQ_COLS]
+    invalid_counts = count_issues(fail)
     total = len(df_req)
     clean_cnt = len(clean_df)
     messy_cnt = len(messy_df)
-    invalid_counts = {
-        'KK_NO': messy_df['Check_Desc'].str.contains('Invalid KK_NO').sum(),
-        'NIK': messy_df['Check_Desc'].str.contains('Invalid NIK').sum(),
-        'Name': messy_df['Check_Desc'].str.contains('Invalid Name').sum(),
-        'Gender': messy_df['Check_Desc'].str.contains('Invalid Gender').sum(),
-        'Place': messy_df['Check_Desc'].str.contains('Invalid Place').sum(),
-        'Birth Date': messy_df['Check_Desc'].str.contains('Invalid Birth Date').sum(),
-    }
 
     # --- Dashboard ---
     st.subheader("Overview Metrics")
@@ -177,10 +245,11 @@ if uploaded_excel and uploaded_city:
     with tab1:
         st.dataframe(clean_df.head(10))
     with tab2:
-        st.dataframe(messy_df[['Check_Desc'] + req].head(10))
+        messy_sample = messy_df.head(10)
+        st.dataframe(messy_sample.assign(Check_Desc=describe_issues(messy_sample, fail))[['Check_Desc'] + REQ_COLS])
 
     # Download report
-    report = generate_excel(messy_df, clean_df, total)
+    report = build_report(excel_bytes, city_bytes, today)
     st.download_button(
         "📥 Download Full Report",
         data=report,